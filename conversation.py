@@ -1,18 +1,23 @@
 import yaml
-from typing import List, Dict, Tuple
+from collections import deque
+from typing import Deque, List, Dict, Tuple
 from pathlib import Path
 
 
 class ConversationManager:
     def __init__(self, max_history: int = 10):
         self.max_history = max_history
-        self.history: List[Dict] = []
+        # *2 because each exchange has 2 messages
+        self.history: Deque[Dict] = deque(maxlen=max_history * 2)
         self._load_prompts()
 
     def _load_prompts(self):
         prompt_path = Path(__file__).parent / "prompt.yaml"
         with open(prompt_path, "r") as f:
             self.prompts = yaml.safe_load(f)
+        self._render_conversation = self.prompts["conversation_template"].format
+        self._render_system_prompt = self.prompts["system_prompt"].format
+        self._system_prompts: Dict[str, str] = {}
 
     def add_message(
         self, role: str, content: str, context: str = None, package_name: str = None
@@ -28,11 +33,8 @@ class ConversationManager:
         Returns:
             Tuple of (formatted_prompt, messages_list)
         """
+        # The deque drops the oldest message once max_history is reached
         self.history.append({"role": role, "content": content})
-        if (
-            len(self.history) > self.max_history * 2
-        ):  # *2 because each exchange has 2 messages
-            self.history = self.history[-self.max_history * 2 :]
 
         # Always return messages, even if context/package_name not provided
         if context and package_name:
@@ -40,7 +42,7 @@ class ConversationManager:
             history_str = self.format_history()
 
             # Format the main prompt
-            prompt = self.prompts["conversation_template"].format(
+            prompt = self._render_conversation(
                 context=context, history=history_str, question=content
             )
 
@@ -54,7 +56,7 @@ class ConversationManager:
             return prompt, messages
         else:
             # Return just the history without additional formatting
-            return None, self.history
+            return None, list(self.history)
 
     def format_history(self) -> str:
         """Format the conversation history as a string."""
@@ -66,4 +68,9 @@ class ConversationManager:
 
     def get_system_prompt(self, package_name: str) -> str:
         """Get the system prompt with package name filled in."""
-        return self.prompts["system_prompt"].format(package_name=package_name)
+        # The system prompt only varies with the package, so render it once
+        if package_name not in self._system_prompts:
+            self._system_prompts[package_name] = self._render_system_prompt(
+                package_name=package_name
+            )
+        return self._system_prompts[package_name]
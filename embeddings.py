@@ -0,0 +1,122 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
+from openai import NOT_GIVEN, OpenAI
+
+# Embedding backend: "openai" for the OpenAI API, "local" for sentence-transformers
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+if EMBEDDING_BACKEND not in {"openai", "local"}:
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+
+# Default embedding model if not specified in environment
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Vector size requested from text-embedding-3 models; older models have a fixed size
+OPENAI_EMBEDDING_DIMENSIONS = (
+    int(os.getenv("OPENAI_EMBEDDING_DIMENSIONS", 512))
+    if OPENAI_EMBEDDING_MODEL.startswith("text-embedding-3")
+    else NOT_GIVEN
+)
+
+# Local model used when EMBEDDING_BACKEND=local
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Identifies the vectors produced, for cache keys and index compatibility checks
+if EMBEDDING_BACKEND == "local":
+    EMBEDDING_MODEL = LOCAL_EMBEDDING_MODEL
+elif OPENAI_EMBEDDING_DIMENSIONS is NOT_GIVEN:
+    EMBEDDING_MODEL = OPENAI_EMBEDDING_MODEL
+else:
+    EMBEDDING_MODEL = f"{OPENAI_EMBEDDING_MODEL}@{OPENAI_EMBEDDING_DIMENSIONS}"
+
+# Number of texts sent in a single embeddings request
+EMBEDDING_BATCH_SIZE = 256
+
+# Number of texts encoded together by the local model
+LOCAL_EMBEDDING_BATCH_SIZE = 128
+
+# Number of embeddings requests in flight at once
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", 8))
+
+# Retries per embeddings request; the OpenAI client backs off exponentially
+# and honours Retry-After on rate limits
+EMBEDDING_MAX_RETRIES = 6
+
+
+@lru_cache(maxsize=1)
+def _openai_client() -> OpenAI:
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), max_retries=EMBEDDING_MAX_RETRIES
+    )
+
+
+@lru_cache(maxsize=1)
+def _local_model():
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise RuntimeError(
+            "EMBEDDING_BACKEND=local requires sentence-transformers. "
+            "Install it with `pip install sentence-transformers`."
+        ) from e
+    return SentenceTransformer(LOCAL_EMBEDDING_MODEL)
+
+
+def _embed_openai(texts: List[str]) -> List[List[float]]:
+    """Embed texts with the OpenAI API using concurrent batched requests."""
+    client = _openai_client()
+    vectors = [None] * len(texts)
+
+    def embed_batch(start: int):
+        # Jitter keeps the first wave of requests from hitting the rate limit together
+        time.sleep(random.uniform(0, 0.2))
+        response = client.embeddings.create(
+            model=OPENAI_EMBEDDING_MODEL,
+            input=texts[start : start + EMBEDDING_BATCH_SIZE],
+            dimensions=OPENAI_EMBEDDING_DIMENSIONS,
+        )
+        vectors[start : start + len(response.data)] = [
+            item.embedding for item in response.data
+        ]
+
+    with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS) as executor:
+        # Consume the results so a failed batch raises here
+        list(executor.map(embed_batch, range(0, len(texts), EMBEDDING_BATCH_SIZE)))
+
+    return vectors
+
+
+def _embed_local(texts: List[str]) -> List[List[float]]:
+    """Embed texts with the local sentence-transformers model."""
+    return (
+        _local_model()
+        .encode(
+            texts,
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        .tolist()
+    )
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed a list of documents with the configured backend."""
+    if EMBEDDING_BACKEND == "local":
+        return _embed_local(texts)
+    return _embed_openai(texts)
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed a single query with the configured backend."""
+    if EMBEDDING_BACKEND == "local":
+        return _embed_local([query])[0]
+    response = _openai_client().embeddings.create(
+        model=OPENAI_EMBEDDING_MODEL,
+        input=[query],
+        dimensions=OPENAI_EMBEDDING_DIMENSIONS,
+    )
+    return response.data[0].embedding
@@ -0,0 +1,58 @@
+import os
+from functools import lru_cache
+from typing import List
+import numpy as np
+
+# Nearest-neighbour search backend: "chroma" (HNSW) or "faiss" (int8 sidecar index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+if VECTOR_BACKEND not in {"chroma", "faiss"}:
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+# File name of the FAISS index inside a package's .chroma_ directory
+FAISS_INDEX_FILE = "faiss.index"
+
+
+def _import_faiss():
+    try:
+        import faiss
+    except ImportError as e:
+        raise RuntimeError(
+            "VECTOR_BACKEND=faiss requires faiss. "
+            "Install it with `pip install faiss-cpu`."
+        ) from e
+    return faiss
+
+
+def faiss_index_path(db_dir: str) -> str:
+    return os.path.join(db_dir, FAISS_INDEX_FILE)
+
+
+def build_faiss_index(vectors: np.ndarray, db_dir: str):
+    """Build an 8-bit quantized inner-product index of vectors and save it.
+
+    Row i of vectors must be the embedding of the chunk with id str(i).
+    """
+    faiss = _import_faiss()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexScalarQuantizer(
+        vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+    )
+    index.train(vectors)
+    index.add(vectors)
+    faiss.write_index(index, faiss_index_path(db_dir))
+
+
+@lru_cache(maxsize=8)
+def load_faiss_index(db_dir: str):
+    """Load a package's FAISS index once and reuse it for later queries."""
+    return _import_faiss().read_index(faiss_index_path(db_dir))
+
+
+def search_faiss_index(db_dir: str, vector: List[float], k: int) -> List[str]:
+    """Return the ids of the k chunks closest to vector, best match first."""
+    faiss = _import_faiss()
+    query = np.asarray([vector], dtype=np.float32)
+    faiss.normalize_L2(query)
+    _, positions = load_faiss_index(db_dir).search(query, k)
+    return [str(position) for position in positions[0] if position != -1]
@@ -1,28 +1,71 @@
 import os
+import ast
+import hashlib
+import io
+import itertools
+import sqlite3
 import tempfile
+import threading
+import warnings
 import requests
 import tarfile
 import zipfile
 import chromadb
-from chromadb.utils import embedding_functions
+import numpy as np
+import orjson
 from pathlib import Path
 import subprocess
 import re
-from typing import List, Set, Dict
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from typing import BinaryIO, Dict, Iterator, List, Set, Tuple
 from rich.console import Console
 from rich.progress import (
     Progress,
     SpinnerColumn,
     TextColumn,
-    BarColumn,
-    TaskProgressColumn,
 )
+from embeddings import EMBEDDING_MODEL, embed_texts
+from faiss_index import VECTOR_BACKEND, build_faiss_index, faiss_index_path
 
 # Initialize rich console
 console = Console()
 
-# Default embedding model if not specified in environment
-OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+# Persistent embedding cache shared by every indexed package
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "_embedding_cache.sqlite")
+
+# Number of chunks embedded and added to the collection at a time; enough to
+# keep every embedding worker busy
+INGEST_BATCH_SIZE = 2048
+
+# HNSW build parameters for new collections; search uses Chroma's default ef_search
+HNSW_CONFIGURATION = {
+    "ef_construction": 100,
+    "max_neighbors": 16,
+}
+
+# Archives at least this large are downloaded as parallel byte ranges, in parts of
+# RANGE_DOWNLOAD_PART_SIZE bytes with up to RANGE_DOWNLOAD_MAX_WORKERS in flight
+RANGE_DOWNLOAD_MIN_SIZE = 8 * 1024 * 1024
+RANGE_DOWNLOAD_PART_SIZE = 2 * 1024 * 1024
+RANGE_DOWNLOAD_MAX_WORKERS = 8
+
+# Number of threads writing zip archive members to disk
+EXTRACT_MAX_WORKERS = os.cpu_count() or 4
+
+# Worker processes reading and chunking files, and the files handed to each
+# worker at a time
+PROCESS_MAX_WORKERS = os.cpu_count() or 4
+PROCESS_CHUNKSIZE = 32
+
+# Files dispatched to the worker processes per round; bounds the chunk text
+# held in memory while earlier chunks are being embedded
+FILE_BATCH_SIZE = 1024
+
+# Maximum number of hashes per cache lookup (SQLite bound-parameter limit)
+CACHE_LOOKUP_BATCH_SIZE = 500
 
 # Python-related file extensions to process
 PYTHON_EXTENSIONS = {
@@ -55,36 +98,41 @@ PYTHON_EXTENSIONS = {
     "CONTRIBUTING.rst": "documentation",
 }
 
+# File types chunked along their top-level statements
+PYTHON_SOURCE_TYPES = {"python", "python-stub"}
+
 # Directories to ignore
-IGNORE_DIRS = {
-    # Build and cache directories
-    ".git",
-    "__pycache__",
-    "venv",
-    ".venv",
-    "env",
-    ".env",
-    "build",
-    "dist",
-    "target",
-    ".pytest_cache",
-    ".mypy_cache",
-    ".ruff_cache",
-    ".coverage",
-    "htmlcov",
-    "site-packages",
-    "node_modules",  # Sometimes present in Python projects
-    ".tox",
-    ".eggs",
-    "*.egg-info",
-    "*.egg",
-    # Documentation and example directories
-    "docs",
-    "doc",
-    "documentation",
-    "examples",
-    "example",
-}
+IGNORE_DIRS = frozenset(
+    {
+        # Build and cache directories
+        ".git",
+        "__pycache__",
+        "venv",
+        ".venv",
+        "env",
+        ".env",
+        "build",
+        "dist",
+        "target",
+        ".pytest_cache",
+        ".mypy_cache",
+        ".ruff_cache",
+        ".coverage",
+        "htmlcov",
+        "site-packages",
+        "node_modules",  # Sometimes present in Python projects
+        ".tox",
+        ".eggs",
+        "*.egg-info",
+        "*.egg",
+        # Documentation and example directories
+        "docs",
+        "doc",
+        "documentation",
+        "examples",
+        "example",
+    }
+)
 
 # Patterns to ignore in directory names
 IGNORE_PATTERNS = {
@@ -95,39 +143,55 @@ IGNORE_PATTERNS = {
     "*examples*",
 }
 
+# Precomputed lookups for the per-file checks in should_process_file
+IGNORE_PREFIXES = tuple(pattern.replace("*", "").lower() for pattern in IGNORE_PATTERNS)
+SUPPORTED_SUFFIXES = frozenset(key for key in PYTHON_EXTENSIONS if key.startswith("."))
+
 
 def download_and_extract_package(package_name_or_repo_url, dest_dir):
     # Check if the input is a GitHub URL
     if re.match(r"https?://github\.com/[\w-]+/[\w-]+", package_name_or_repo_url):
         # Clone the repository
         console.print(f"[bold blue]Cloning repository:[/] {package_name_or_repo_url}")
-        subprocess.run(["git", "clone", package_name_or_repo_url, dest_dir], check=True)
+        # Only the current tree is indexed, so skip the history entirely
+        subprocess.run(
+            [
+                "git",
+                "clone",
+                "--depth=1",
+                "--filter=blob:none",
+                "--single-branch",
+                package_name_or_repo_url,
+                dest_dir,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
         return dest_dir  # Return the directory where the repo was cloned
     else:
         # Treat as a PyPI package
         console.print(f"[bold blue]Downloading package:[/] {package_name_or_repo_url}")
         resp = requests.get(f"https://pypi.org/pypi/{package_name_or_repo_url}/json")
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         url = data["urls"][0]["url"]
+        size = data["urls"][0]["size"]
         filename = url.split("/")[-1]
-        pkg_path = os.path.join(dest_dir, filename)
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(pkg_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        # Extract
-        console.print(f"[bold blue]Extracting package...[/]")
-        if filename.endswith(".zip"):
-            with zipfile.ZipFile(pkg_path, "r") as zip_ref:
-                zip_ref.extractall(dest_dir)
-        elif filename.endswith((".tar.gz", ".tgz")):
-            with tarfile.open(pkg_path, "r:gz") as tar_ref:
-                tar_ref.extractall(dest_dir)
-        else:
+        if not filename.endswith((".zip", ".tar.gz", ".tgz")):
             raise ValueError("Unknown archive format: " + filename)
 
+        # Extract straight from the download instead of saving the archive first
+        with open_download(url, size) as f:
+            console.print(f"[bold blue]Extracting package...[/]")
+            if filename.endswith(".zip"):
+                # Zip archives need a seekable file, so buffer them in memory
+                with zipfile.ZipFile(io.BytesIO(f.read()), "r") as zip_ref:
+                    extract_zip(zip_ref, dest_dir)
+            else:
+                # Sequential "r|gz" mode unpacks members as the bytes arrive
+                with tarfile.open(fileobj=f, mode="r|gz") as tar_ref:
+                    tar_ref.extractall(dest_dir)
+
         # Find the main package directory
         # For PyPI packages, it's usually the directory with the same name as the package
         package_name = package_name_or_repo_url.lower()
@@ -153,137 +217,439 @@ def download_and_extract_package(package_name_or_repo_url, dest_dir):
         return str(package_dir)
 
 
+def open_download(url: str, size: int) -> BinaryIO:
+    """Open a download as a file object, fetched as parallel byte ranges when large."""
+    headers = {}
+    if size >= RANGE_DOWNLOAD_MIN_SIZE:
+        headers = range_headers(0, min(RANGE_DOWNLOAD_PART_SIZE, size) - 1)
+    r = requests.get(url, headers=headers, stream=True)
+    try:
+        r.raise_for_status()
+    except requests.HTTPError:
+        r.close()
+        raise
+    # A 206 shows the server honours ranges, so fetch the rest in parallel;
+    # otherwise the response already carries the whole body
+    if r.status_code == 206:
+        return io.BufferedReader(RangeReader(r, size), RANGE_DOWNLOAD_PART_SIZE)
+    r.raw.decode_content = True
+    return r.raw
+
+
+def range_headers(start: int, end: int) -> Dict[str, str]:
+    # Ask for the bytes as stored, so every part has exactly the requested length
+    return {"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"}
+
+
+class RangeReader(io.RawIOBase):
+    """Read a URL front to back while the byte ranges ahead download in parallel."""
+
+    def __init__(self, first: requests.Response, size: int):
+        self.url = first.url
+        self.size = size
+        self.sessions = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=RANGE_DOWNLOAD_MAX_WORKERS)
+        # Part 0 is the response that proved range support
+        starts = range(RANGE_DOWNLOAD_PART_SIZE, size, RANGE_DOWNLOAD_PART_SIZE)
+        self.starts = iter(starts)
+        self.pending = deque([self.executor.submit(self.read_part, first, 0)])
+        self.part = memoryview(b"")
+        # Keep a bounded window of parts in flight so memory stays flat
+        for start in itertools.islice(self.starts, 2 * RANGE_DOWNLOAD_MAX_WORKERS - 1):
+            self.pending.append(self.executor.submit(self.fetch_range, start))
+
+    def fetch_range(self, start: int) -> bytes:
+        # One session per worker thread reuses its connection across parts
+        if not hasattr(self.sessions, "session"):
+            self.sessions.session = requests.Session()
+        end = min(start + RANGE_DOWNLOAD_PART_SIZE, self.size) - 1
+        r = self.sessions.session.get(
+            self.url, headers=range_headers(start, end), stream=True
+        )
+        return self.read_part(r, start)
+
+    def read_part(self, r: requests.Response, start: int) -> bytes:
+        end = min(start + RANGE_DOWNLOAD_PART_SIZE, self.size) - 1
+        with r:
+            r.raise_for_status()
+            if r.status_code != 206 or len(r.content) != end - start + 1:
+                raise RuntimeError(f"Server ignored range request for {self.url}")
+            return r.content
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.part:
+            if not self.pending:
+                return 0
+            self.part = memoryview(self.pending.popleft().result())
+            start = next(self.starts, None)
+            if start is not None:
+                self.pending.append(self.executor.submit(self.fetch_range, start))
+        n = min(len(buffer), len(self.part))
+        buffer[:n] = self.part[:n]
+        self.part = self.part[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.executor.shutdown(cancel_futures=True)
+        super().close()
+
+
+def extract_zip(zip_ref: zipfile.ZipFile, dest_dir: str):
+    """Extract a zip archive, writing its members from a thread pool."""
+    members = zip_ref.infolist()
+
+    # Have ZipFile create every directory first, with its own path cleaning,
+    # so the workers never race on makedirs
+    dirs = {member.filename.rpartition("/")[0] for member in members}
+    for name in sorted(dirs - {""}):
+        zip_ref.extract(zipfile.ZipInfo(name + "/"), dest_dir)
+
+    with ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS) as executor:
+        # Consume the results so a failed member raises here
+        list(executor.map(lambda member: zip_ref.extract(member, dest_dir), members))
+
+
+def is_ignored_dir(name: str) -> bool:
+    """Check if a directory name matches IGNORE_DIRS or IGNORE_PATTERNS."""
+    return name in IGNORE_DIRS or name.lower().startswith(IGNORE_PREFIXES)
+
+
 def should_process_file(file_path: Path) -> bool:
     """Check if a file should be processed based on its path and extension."""
+    # Check the extension first, it rejects most files cheaply
+    if (
+        file_path.suffix.lower() not in SUPPORTED_SUFFIXES
+        and file_path.name not in PYTHON_EXTENSIONS
+    ):
+        return False
+
     # Check if file is in an ignored directory
     for part in file_path.parts:
-        # Check exact directory names
-        if part in IGNORE_DIRS:
+        if is_ignored_dir(part):
             return False
+    return True
 
-        # Check directory name patterns
-        if any(
-            part.lower().startswith(pattern.replace("*", ""))
-            for pattern in IGNORE_PATTERNS
-        ):
-            return False
 
-    # Check if file has a supported extension or is a special Python file
-    return (
-        file_path.suffix.lower() in PYTHON_EXTENSIONS
-        or file_path.name in PYTHON_EXTENSIONS
-    )
+def process_file(file_path: Path) -> Tuple[str, List[str], str]:
+    """Read and chunk a single file.
 
+    Runs in worker processes, so it has to stay a top-level function.
+
+    Returns:
+        Tuple of (file_type, chunks, error); file_type is None when the file
+        could not be decoded and error is set when processing failed
+    """
+    try:
+        # Try to read the file with different encodings
+        for encoding in ["utf-8", "latin-1", "cp1252"]:
+            try:
+                text = file_path.read_text(encoding=encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            # If all encodings fail, skip the file
+            return None, [], None
+
+        # Get file type from extension or name
+        file_type = PYTHON_EXTENSIONS.get(
+            file_path.suffix.lower(),
+            PYTHON_EXTENSIONS.get(file_path.name, "unknown"),
+        )
+
+        if file_type in PYTHON_SOURCE_TYPES:
+            return file_type, chunk_python(text), None
+        return file_type, chunk_text(text), None
+    except Exception as e:
+        return None, [], str(e)
 
-def collect_text_files(root_dir: str) -> List[Dict]:
-    """Collect all Python-related files recursively from the root directory."""
-    files = []
-    root_path = Path(root_dir)
 
-    # Count total files first
-    total_files = sum(1 for _ in root_path.rglob("*") if _.is_file())
+def iter_chunks(root_dir: str) -> Iterator[Tuple[str, Dict]]:
+    """Yield (chunk, metadata) pairs for the Python-related files under root_dir.
+
+    Files are read and chunked in parallel by worker processes, one batch of
+    files at a time, so only that batch's text is held in memory.
+    """
+    root_path = Path(root_dir)
     processed_files = 0
+    indexed_files = 0
     skipped_files = 0
+    file_types = {}
 
     console.print(f"\n[bold blue]Scanning for Python files...[/]")
 
-    # Walk through all files recursively
-    for file_path in root_path.rglob("*"):
-        if file_path.is_file():
-            processed_files += 1
-            if should_process_file(file_path):
-                try:
-                    # Try to read the file with different encodings
-                    for encoding in ["utf-8", "latin-1", "cp1252"]:
-                        try:
-                            text = file_path.read_text(encoding=encoding)
-                            break
-                        except UnicodeDecodeError:
-                            continue
-                    else:
-                        # If all encodings fail, skip the file
-                        skipped_files += 1
-                        continue
-
-                    # Get file type from extension or name
-                    file_type = PYTHON_EXTENSIONS.get(
-                        file_path.suffix.lower(),
-                        PYTHON_EXTENSIONS.get(file_path.name, "unknown"),
-                    )
+    def iter_files() -> Iterator[Path]:
+        nonlocal processed_files, skipped_files
 
-                    # Add file info
-                    files.append(
-                        {
-                            "path": str(file_path),
-                            "content": text,
-                            "type": file_type,
-                            "relative_path": str(file_path.relative_to(root_path)),
-                        }
-                    )
-                except Exception as e:
+        # Walk the tree once, pruning ignored directories so they are never entered
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            dirnames[:] = [name for name in dirnames if not is_ignored_dir(name)]
+
+            for filename in filenames:
+                file_path = Path(dirpath, filename)
+                processed_files += 1
+                if should_process_file(file_path):
+                    yield file_path
+                else:
+                    skipped_files += 1
+
+                # Print progress every 100 files
+                if processed_files % 100 == 0:
+                    console.print(f"Processed {processed_files} files...")
+
+    with ProcessPoolExecutor(max_workers=PROCESS_MAX_WORKERS) as executor:
+        for paths in itertools.batched(iter_files(), FILE_BATCH_SIZE):
+            results = executor.map(process_file, paths, chunksize=PROCESS_CHUNKSIZE)
+            for file_path, (file_type, file_chunks, error) in zip(paths, results):
+                if error is not None:
                     console.print(
-                        f"[yellow]Warning:[/] Error processing {file_path}: {e}"
+                        f"[yellow]Warning:[/] Error processing {file_path}: {error}"
                     )
+                if file_type is None:
                     skipped_files += 1
                     continue
-            else:
-                skipped_files += 1
 
-            # Print progress every 100 files
-            if processed_files % 100 == 0:
-                console.print(f"Processed {processed_files}/{total_files} files...")
+                metadata = {
+                    "source": str(file_path.relative_to(root_path)),
+                    "type": file_type,
+                    "full_path": str(file_path),
+                }
+                for chunk in file_chunks:
+                    yield chunk, metadata
+                indexed_files += 1
+                file_types[file_type] = file_types.get(file_type, 0) + 1
 
     # Print final statistics
     console.print(f"\n[bold green]File processing complete![/]")
-    console.print(f"Total files scanned: {total_files}")
-    console.print(f"Files processed: {len(files)}")
+    console.print(f"Total files scanned: {processed_files}")
+    console.print(f"Files processed: {indexed_files}")
     console.print(f"Files skipped: {skipped_files}")
 
     # Print file type statistics
-    file_types = {}
-    for file in files:
-        file_types[file["type"]] = file_types.get(file["type"], 0) + 1
-
     console.print("\n[bold blue]File type statistics:[/]")
     for file_type, count in sorted(file_types.items()):
         console.print(f"{file_type}: {count} files")
 
-    return files
+
+def iter_sections(text: str, max_length: int):
+    """Yield spans of the blank-line separated sections of text.
+
+    Sections longer than max_length are yielded line by line. Each span is a
+    (start, end, separator_length) tuple of offsets into text.
+    """
+    pos = 0
+    while pos <= len(text):
+        end = text.find("\n\n", pos)
+        if end == -1:
+            end = len(text)
+        if end - pos > max_length:
+            line_start = pos
+            while line_start <= end:
+                line_end = text.find("\n", line_start, end)
+                if line_end == -1:
+                    line_end = end
+                yield line_start, line_end, 1
+                line_start = line_end + 1
+        else:
+            yield pos, end, 2
+        pos = end + 2
 
 
 def chunk_text(text: str, max_length: int = 1000) -> List[str]:
     """Split text into chunks while trying to preserve logical boundaries."""
-    # Split by double newlines first to preserve document structure
-    sections = text.split("\n\n")
+    # Small files fit in a single chunk
+    if len(text) <= max_length:
+        return [text] if text.strip() else []
+
+    # Chunks are slices of the original text, located without splitting it
     chunks = []
-    current_chunk = []
+    chunk_start = chunk_end = None
     current_length = 0
 
-    for section in sections:
-        # If section is too long, split it by single newlines
-        if len(section) > max_length:
-            lines = section.split("\n")
-            for line in lines:
-                if current_length + len(line) > max_length and current_chunk:
-                    chunks.append("\n".join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                current_chunk.append(line)
-                current_length += len(line) + 1  # +1 for newline
-        else:
-            # If adding this section would exceed max_length, start a new chunk
-            if current_length + len(section) > max_length and current_chunk:
-                chunks.append("\n".join(current_chunk))
-                current_chunk = []
-                current_length = 0
-            current_chunk.append(section)
-            current_length += len(section) + 2  # +2 for double newline
+    for start, end, separator_length in iter_sections(text, max_length):
+        # If adding this span would exceed max_length, start a new chunk
+        if chunk_start is not None and current_length + end - start > max_length:
+            chunks.append(text[chunk_start:chunk_end])
+            chunk_start = None
+            current_length = 0
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+        current_length += end - start + separator_length
 
     # Add the last chunk if it exists
-    if current_chunk:
-        chunks.append("\n".join(current_chunk))
+    if chunk_start is not None:
+        chunks.append(text[chunk_start:chunk_end])
+
+    # Whitespace-only chunks carry nothing worth embedding
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def chunk_python(source: str, max_length: int = 1000) -> List[str]:
+    """Split Python source into chunks aligned to statement boundaries.
+
+    Adjacent top-level statements are packed together up to max_length, and
+    classes longer than that are split between their members, so functions
+    and methods are not cut in half. Single definitions longer than
+    max_length and files that do not parse fall back to chunk_text.
+    """
+    if len(source) <= max_length:
+        return chunk_text(source, max_length)
+    try:
+        # Invalid escape sequences in indexed code would warn from the workers
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", SyntaxWarning)
+            warnings.simplefilter("ignore", DeprecationWarning)
+            tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return chunk_text(source, max_length)
+
+    # Offsets of the start of each line, indexed by line number - 1
+    line_starts = [0]
+    pos = source.find("\n")
+    while pos != -1:
+        line_starts.append(pos + 1)
+        pos = source.find("\n", pos + 1)
+
+    def statement_start(node: ast.stmt) -> int:
+        # A statement starts at its first decorator, plus comments right above it
+        decorators = getattr(node, "decorator_list", [])
+        line = min([node.lineno] + [decorator.lineno for decorator in decorators])
+        while line > 1:
+            previous = source[line_starts[line - 2] : line_starts[line - 1]]
+            if not previous.lstrip().startswith("#"):
+                break
+            line -= 1
+        return line_starts[line - 1]
+
+    def statement_end(node: ast.stmt) -> int:
+        if node.end_lineno < len(line_starts):
+            return line_starts[node.end_lineno]
+        return len(source)
+
+    boundaries = [0]
+
+    def add_boundaries(nodes: List[ast.stmt]):
+        for node in nodes:
+            boundaries.append(max(statement_start(node), boundaries[-1]))
+            if (
+                isinstance(node, ast.ClassDef)
+                and statement_end(node) - statement_start(node) > max_length
+            ):
+                # Keep the class header together with its docstring
+                members = node.body
+                if ast.get_docstring(node) is not None:
+                    members = members[1:]
+                add_boundaries(members)
+
+    add_boundaries(tree.body)
+    boundaries.append(len(source))
 
-    return chunks
+    chunks = []
+    chunk_start = chunk_end = None
+
+    for start, end in zip(boundaries, boundaries[1:]):
+        # If adding this segment would exceed max_length, start a new chunk
+        if chunk_start is not None and end - chunk_start > max_length:
+            chunks.append(source[chunk_start:chunk_end])
+            chunk_start = None
+        if end - start > max_length:
+            chunks.extend(chunk_text(source[start:end], max_length))
+            continue
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+
+    # Add the last chunk if it exists
+    if chunk_start is not None:
+        chunks.append(source[chunk_start:chunk_end])
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def open_embedding_cache(path: str = EMBEDDING_CACHE_PATH) -> sqlite3.Connection:
+    """Open the on-disk embedding cache, creating its table if needed."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "hash BLOB NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+        "PRIMARY KEY (hash, model))"
+    )
+    return conn
+
+
+def embed_with_cache(
+    docs: List[str], embed, model: str = EMBEDDING_MODEL
+) -> List[List[float]]:
+    """Embed documents, reusing vectors cached by (sha256(text), model).
+
+    Identical documents share a hash and are embedded only once.
+
+    Args:
+        docs: The chunk texts to embed
+        embed: Callable mapping a list of texts to a list of vectors
+        model: Name of the embedding model, part of the cache key
+
+    Returns:
+        One embedding per document, in the same order as ``docs``
+    """
+    hashes = [hashlib.sha256(doc.encode()).digest() for doc in docs]
+    vectors = {}
+
+    with closing(open_embedding_cache()) as conn:
+        # Look up every known hash for this model
+        for i in range(0, len(hashes), CACHE_LOOKUP_BATCH_SIZE):
+            batch = hashes[i : i + CACHE_LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                "SELECT hash, vector FROM embeddings "
+                f"WHERE model = ? AND hash IN ({placeholders})",
+                (model, *batch),
+            )
+            for digest, blob in rows:
+                vectors[digest] = array("f", blob).tolist()
+
+        # Only cache misses go to the embedding API, each distinct text once
+        misses = {}
+        for doc, digest in zip(docs, hashes):
+            if digest not in vectors:
+                misses.setdefault(digest, doc)
+        console.print(
+            f"Embedding {len(misses)} unique new chunks "
+            f"({len(docs) - len(misses)} reused from cache or duplicates)..."
+        )
+
+        if misses:
+            new_vectors = embed(list(misses.values()))
+            rows = []
+            for digest, vector in zip(misses, new_vectors):
+                packed = array("f", vector)
+                vectors[digest] = packed.tolist()
+                rows.append((digest, model, packed.tobytes()))
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (hash, model, vector) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    return [vectors[digest] for digest in hashes]
+
+
+def index_chunks(collection, docs: List[str], metadatas: List[Dict], start_id: int):
+    """Embed a batch of chunks, add it to the collection and return the vectors."""
+    embeddings = embed_with_cache(docs, embed_texts)
+    collection.add(
+        documents=docs,
+        metadatas=metadatas,
+        ids=[str(i) for i in range(start_id, start_id + len(docs))],
+        embeddings=embeddings,
+    )
+    return embeddings
 
 
 def ingest_and_index_package(package_name_or_repo_url: str):
@@ -291,59 +657,76 @@ def ingest_and_index_package(package_name_or_repo_url: str):
     identifier = package_name_or_repo_url.split("/")[-1].replace(".git", "")
     db_dir = f".chroma_{identifier}"
     if os.path.exists(db_dir):
-        console.print(f"[yellow]Package already indexed at {db_dir}[/]")
-        return  # Already indexed
+        client = chromadb.PersistentClient(path=db_dir)
+        collection = client.get_or_create_collection(
+            name="docs",
+            embedding_function=None,
+        )
+        if (collection.metadata or {}).get("embedding_model") == EMBEDDING_MODEL and (
+            VECTOR_BACKEND != "faiss" or os.path.exists(faiss_index_path(db_dir))
+        ):
+            console.print(f"[yellow]Package already indexed at {db_dir}[/]")
+            return  # Already indexed
+
+        # Incomplete indexes and vectors of another model or size are rebuilt
+        console.print(
+            f"[yellow]Re-indexing {db_dir}: previous index is incomplete or "
+            f"was built with another embedding model[/]"
+        )
+        client.delete_collection("docs")
+        if os.path.exists(faiss_index_path(db_dir)):
+            os.remove(faiss_index_path(db_dir))
 
     with tempfile.TemporaryDirectory() as tmpdir:
         package_dir = download_and_extract_package(package_name_or_repo_url, tmpdir)
-        files = collect_text_files(package_dir)
+        chunks = iter_chunks(package_dir)
+        first_chunk = next(chunks, None)
 
-        if not files:
+        if first_chunk is None:
             raise RuntimeError(
                 f"No valid Python files found in {package_name_or_repo_url}. Please check if the package/repository contains any Python source files or documentation."
             )
 
-        console.print("\n[bold blue]Processing files and creating chunks...[/]")
-        docs = []
-        metadatas = []
+        console.print("\n[bold blue]Indexing chunks with ChromaDB...[/]")
+
+        # Index with ChromaDB
+        client = chromadb.PersistentClient(path=db_dir)
+        # Embeddings are computed up front, so the collection needs no function
+        collection = client.get_or_create_collection(
+            name="docs",
+            embedding_function=None,
+            configuration={"hnsw": HNSW_CONFIGURATION},
+        )
+
+        # Embed and add chunks in batches as the files are read
+        total_chunks = 0
+        vector_batches = []
 
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
+            TextColumn("{task.completed} chunks"),
             console=console,
         ) as progress:
-            task = progress.add_task("Creating chunks...", total=len(files))
-
-            for file_info in files:
-                for chunk in chunk_text(file_info["content"]):
-                    docs.append(chunk)
-                    metadatas.append(
-                        {
-                            "source": file_info["relative_path"],
-                            "type": file_info["type"],
-                            "full_path": file_info["path"],
-                        }
-                    )
-                progress.update(task, advance=1)
+            task = progress.add_task("Indexing chunks...", total=None)
 
-        console.print(f"\n[bold blue]Indexing {len(docs)} chunks with ChromaDB...[/]")
+            for batch in itertools.batched(
+                itertools.chain([first_chunk], chunks), INGEST_BATCH_SIZE
+            ):
+                docs, metadatas = map(list, zip(*batch))
+                embeddings = index_chunks(collection, docs, metadatas, total_chunks)
+                if VECTOR_BACKEND == "faiss":
+                    vector_batches.append(np.asarray(embeddings, dtype=np.float32))
+                total_chunks += len(docs)
+                progress.update(task, advance=len(docs))
 
-        # Index with ChromaDB
-        client = chromadb.PersistentClient(path=db_dir)
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model_name=OPENAI_EMBEDDING_MODEL,
-        )
-        collection = client.get_or_create_collection(
-            name="docs",
-            embedding_function=openai_ef,
-        )
-        collection.add(
-            documents=docs, metadatas=metadatas, ids=[str(i) for i in range(len(docs))]
-        )
+        if VECTOR_BACKEND == "faiss":
+            console.print("\n[bold blue]Building quantized FAISS index...[/]")
+            build_faiss_index(np.concatenate(vector_batches), db_dir)
+
+        # Mark the index complete only now, so an interrupted run is redone
+        collection.modify(metadata={"embedding_model": EMBEDDING_MODEL})
 
         console.print(f"\n[bold green]Indexing complete![/]")
-        console.print(f"Total chunks indexed: {len(docs)}")
+        console.print(f"Total chunks indexed: {total_chunks}")
         console.print(f"Index location: {db_dir}")
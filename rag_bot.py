@@ -1,3 +1,8 @@
+from dotenv import load_dotenv
+
+# Load .env file if it exists, before the project modules read their settings
+load_dotenv()
+
 import argparse
 from ingest import ingest_and_index_package
 from retriever import retrieve_relevant_chunks
@@ -5,12 +10,8 @@ from openai import OpenAI
 import os
 from rich import print
 from rich.prompt import Prompt
-from dotenv import load_dotenv
 from conversation import ConversationManager
 
-# Load .env file if it exists
-load_dotenv()
-
 
 def main():
     parser = argparse.ArgumentParser(description="RAG Bot for Python Packages")
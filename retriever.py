@@ -1,17 +1,74 @@
 import os
-import glob
+from collections import deque
+from functools import lru_cache
 import chromadb
-from chromadb.utils import embedding_functions
+import numpy as np
+from embeddings import EMBEDDING_MODEL, embed_query
+from faiss_index import VECTOR_BACKEND, faiss_index_path, search_faiss_index
 
-# Default embedding model if not specified in environment
-OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+# Cosine similarity above which an earlier query's results are reused
+SEMANTIC_CACHE_THRESHOLD = 0.97
 
+# Number of recent queries kept in the semantic cache
+SEMANTIC_CACHE_SIZE = 256
 
-def get_latest_package_name():
-    chroma_dirs = sorted(glob.glob(".chroma_*/"), key=os.path.getmtime, reverse=True)
-    if not chroma_dirs:
+# Recent (package_name, k, unit query vector, documents) entries
+_semantic_cache = deque(maxlen=SEMANTIC_CACHE_SIZE)
+
+
+@lru_cache(maxsize=1024)
+def _embed_query_cached(query: str) -> tuple:
+    return tuple(embed_query(query))
+
+
+def _lookup_semantic_cache(package_name: str, k: int, vector: np.ndarray):
+    """Return the documents of a cached query close enough to vector, if any."""
+    entries = [
+        entry for entry in _semantic_cache if entry[0] == package_name and entry[1] == k
+    ]
+    if not entries:
+        return None
+    similarities = np.stack([entry[2] for entry in entries]) @ vector
+    best = int(np.argmax(similarities))
+    if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return entries[best][3]
+    return None
+
+
+@lru_cache(maxsize=8)
+def _get_collection(package_name: str):
+    """Open a package's collection once and reuse it for later queries."""
+    client = chromadb.PersistentClient(path=f".chroma_{package_name}")
+    collection = client.get_or_create_collection(
+        name="docs",
+        embedding_function=None,
+    )
+    if (collection.metadata or {}).get("embedding_model") != EMBEDDING_MODEL:
+        raise RuntimeError(
+            f"Index for package '{package_name}' was built with a different "
+            f"embedding model than {EMBEDDING_MODEL}. Please ingest it again."
+        )
+    return collection
+
+
+@lru_cache(maxsize=1)
+def _find_latest_package_name(cwd: str, cwd_mtime: float) -> str:
+    # Single pass over the directory, DirEntry.stat() needs no extra lookups
+    latest, latest_mtime = None, -1.0
+    with os.scandir(cwd) as entries:
+        for entry in entries:
+            if entry.name.startswith(".chroma_") and entry.is_dir():
+                mtime = entry.stat().st_mtime
+                if mtime > latest_mtime:
+                    latest, latest_mtime = entry.name, mtime
+    if latest is None:
         raise RuntimeError("No indexed package found. Please ingest a package first.")
-    return chroma_dirs[0].replace(".chroma_", "").strip("/\\")
+    return latest[len(".chroma_") :]
+
+
+def get_latest_package_name():
+    # Indexing a new package changes the directory's mtime, invalidating the cache
+    return _find_latest_package_name(os.getcwd(), os.path.getmtime("."))
 
 
 def retrieve_relevant_chunks(query: str, package_name: str = None, k: int = 5):
@@ -22,14 +79,31 @@ def retrieve_relevant_chunks(query: str, package_name: str = None, k: int = 5):
         raise RuntimeError(
             f"No index found for package '{package_name}'. Please ingest it first."
         )
-    client = chromadb.PersistentClient(path=db_dir)
-    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        model_name=OPENAI_EMBEDDING_MODEL,
-    )
-    collection = client.get_or_create_collection(
-        name="docs",
-        embedding_function=openai_ef,
-    )
-    results = collection.query(query_texts=[query], n_results=k)
-    return results["documents"][0] if results["documents"] else []
+
+    # Near-duplicate questions reuse the results of an earlier query
+    embedding = _embed_query_cached(query)
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector /= np.linalg.norm(vector)
+    cached = _lookup_semantic_cache(package_name, k, vector)
+    if cached is not None:
+        return list(cached)
+
+    collection = _get_collection(package_name)
+    if VECTOR_BACKEND == "faiss":
+        if not os.path.exists(faiss_index_path(db_dir)):
+            raise RuntimeError(
+                f"No FAISS index found for package '{package_name}'. "
+                "Please ingest it with VECTOR_BACKEND=faiss first."
+            )
+        # FAISS ranks the chunks, Chroma stores their text
+        ids = search_faiss_index(db_dir, list(embedding), k)
+        results = collection.get(ids=ids, include=["documents"])
+        documents_by_id = dict(zip(results["ids"], results["documents"]))
+        documents = [
+            documents_by_id[chunk_id] for chunk_id in ids if chunk_id in documents_by_id
+        ]
+    else:
+        results = collection.query(query_embeddings=[list(embedding)], n_results=k)
+        documents = results["documents"][0] if results["documents"] else []
+    _semantic_cache.append((package_name, k, vector, documents))
+    return list(documents)